@@ -1,7 +1,7 @@
 import rasterio
-from rasterio.mask import mask
 from rasterio.warp import transform_bounds, transform_geom
-from shapely.geometry import box
+from rasterio.windows import Window
+from shapely.geometry import box, shape
 import os
 
 def get_bounds(filepath):
@@ -39,11 +39,22 @@ def crop_to_overlap(s1_path, s2_path, output_folder_s1, output_folder_s2):
         def crop_and_save(input_path, output_folder, image_type):
             with rasterio.open(input_path) as src:
                 try:
-                    # Transform overlap geometry from WGS84 to the image's CRS
+                    # Transform overlap geometry from WGS84 to the image's CRS once
                     geom = transform_geom("EPSG:4326", src.crs, overlap_area.__geo_interface__)
-                    
-                    # Perform the crop
-                    out_image, out_transform = mask(src, [geom], crop=True)
+
+                    # The overlap is a plain bounding box, so a windowed
+                    # read is exact and avoids mask()'s per-pixel
+                    # geometry test over the whole scene
+                    minx, miny, maxx, maxy = shape(geom).bounds
+                    window = src.window(minx, miny, maxx, maxy)
+                    # Round outward so the WGS84 round-trip cannot shave
+                    # a pixel off the overlap, then clamp to the dataset
+                    # extent so window_transform matches what read()
+                    # actually returns
+                    window = window.round_offsets(op='floor').round_lengths(op='ceil')
+                    window = window.intersection(Window(0, 0, src.width, src.height))
+                    out_image = src.read(window=window)
+                    out_transform = src.window_transform(window)
                     
                     out_meta = src.meta.copy()
                     out_meta.update({
@@ -1,11 +1,39 @@
 import rasterio
 from rasterio.enums import Resampling
+from rasterio.windows import Window
+from rasterio.vrt import WarpedVRT
 import numpy as np
-import matplotlib.pyplot as plt
+import numexpr as ne
+import bottleneck as bn
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import os
 from PIL import Image
 
+try:
+    import imagecodecs
+except ImportError:
+    imagecodecs = None
+
+try:
+    import cupy as cp
+except ImportError:
+    cp = None
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+def write_png(data, png_path):
+    """Write a uint8 array as PNG, using imagecodecs' vectorized DEFLATE
+    when available and falling back to a fast PIL encode otherwise."""
+    if imagecodecs is not None:
+        with open(png_path, 'wb') as f:
+            f.write(imagecodecs.png_encode(data, level=1))
+    else:
+        Image.fromarray(data).save(png_path, compress_level=1, optimize=False)
+
 class Sentinel2Processor:
     def __init__(self, safe_path: str):
         """
@@ -16,124 +44,427 @@ class Sentinel2Processor:
         self.safe_path = Path(safe_path)
         self.bands = {}
         self.indices = {}
+        # PNG encodes release the GIL, so they run on a small background
+        # pool and overlap with the next GeoTIFF write
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
+        self._png_futures = []
+        # Resolve the granule directory once; find_band_path runs per
+        # band and re-globbing GRANULE each time costs a directory scan
+        try:
+            self._granule_dir = next(self.safe_path.glob('GRANULE/L2A_*'))
+        except StopIteration:
+            raise FileNotFoundError(f"No L2A granule found in {self.safe_path}")
+        self._img_data_path = self._granule_dir / 'IMG_DATA'
+        self._band_paths = self._scan_band_paths()
+
+    RESOLUTION_MAP = {
+        'B02': 'R10m',  # Blue - 10m
+        'B03': 'R10m',  # Green - 10m
+        'B04': 'R10m',  # Red - 10m
+        'B08': 'R10m',  # NIR - 10m
+        'B11': 'R20m',  # SWIR1 - 20m
+        'B12': 'R20m'   # SWIR2 - 20m
+    }
+
+    def _scan_band_paths(self):
+        """Index the band .jp2 files with one scandir per resolution folder.
+
+        Replaces a glob per band (12 directory scans per scene) with two
+        scans total, and drops macOS AppleDouble '._' files up front.
+        """
+        entries_by_res = {}
+        for resolution in set(self.RESOLUTION_MAP.values()):
+            res_dir = self._img_data_path / resolution
+            names = []
+            if res_dir.is_dir():
+                with os.scandir(res_dir) as it:
+                    names = [entry.name for entry in it
+                             if not entry.name.startswith('._')
+                             and entry.name.endswith('.jp2')]
+            entries_by_res[resolution] = names
+
+        band_paths = {}
+        for band_name, resolution in self.RESOLUTION_MAP.items():
+            for name in entries_by_res[resolution]:
+                if f'_{band_name}_' in name:
+                    band_paths[band_name] = str(
+                        self._img_data_path / resolution / name)
+                    break
+        return band_paths
 
     def find_band_path(self, band_name: str) -> str:
         """Find the correct path for a given band."""
         try:
-            granule_dir = list(self.safe_path.glob('GRANULE/L2A_*'))[0]
-        except IndexError:
-            raise FileNotFoundError(f"No L2A granule found in {self.safe_path}")
-            
-        resolution_map = {
-            'B02': 'R10m',  # Blue - 10m
-            'B03': 'R10m',  # Green - 10m
-            'B04': 'R10m',  # Red - 10m
-            'B08': 'R10m',  # NIR - 10m
-            'B11': 'R20m',  # SWIR1 - 20m
-            'B12': 'R20m'   # SWIR2 - 20m
-        }
-        
-        img_data_path = granule_dir / 'IMG_DATA'
-        resolution = resolution_map[band_name]
-        band_pattern = f'*_{band_name}_*.jp2'
-        band_files = list(img_data_path.glob(f'{resolution}/{band_pattern}'))
-        
-        if not band_files:
-            raise FileNotFoundError(f"Could not find {band_name} in {img_data_path}")
-        return str(band_files[0])
+            return self._band_paths[band_name]
+        except KeyError:
+            raise FileNotFoundError(f"Could not find {band_name} in {self._img_data_path}")
 
-    def load_bands(self):
-        """Load required Sentinel-2 bands."""
-        required_bands = ['B02', 'B03', 'B04', 'B08', 'B11', 'B12']
-        
-        for band_name in required_bands:
-            band_path = self.find_band_path(band_name)
-            with rasterio.open(band_path) as src:
-                data = src.read(1).astype(float)
-                # Resample 20m bands to 10m resolution
-                if band_name in ['B11', 'B12']:
-                    target_shape = (src.height * 2, src.width * 2)
-                    data = src.read(
-                        1,
-                        out_shape=target_shape,
-                        resampling=Resampling.bilinear
-                    )
-                self.bands[band_name] = data
-                # Save metadata from B04 as a reference
-                if band_name == 'B04':
-                    self.meta = src.meta
+    def _read_band(self, band_name: str):
+        """Open and decode one band; safe to run on a worker thread."""
+        band_path = self.find_band_path(band_name)
+        with rasterio.open(band_path) as src:
+            # float32 keeps full index precision at half the RAM and
+            # memory bandwidth of the default float64 upcast
+            if band_name in ['B11', 'B12']:
+                # On repeated runs over the same scene, reuse the cached
+                # 10m sidecar instead of redoing the JP2 decode + warp
+                cache_path = self.safe_path / f'.cache_{band_name}_10m.tif'
+                if (cache_path.exists()
+                        and os.path.getmtime(cache_path) >= os.path.getmtime(band_path)):
+                    with rasterio.open(cache_path) as cached:
+                        data = cached.read(1, out=np.empty(
+                            (cached.height, cached.width), dtype=np.float32))
+                    return data, src.meta
+
+                # Resample 20m bands to 10m resolution in the same single
+                # read; for a pure 2x upsample the out_shape path does the
+                # bilinear interpolation inline without a VRT layer
+                data = src.read(
+                    1,
+                    out=np.empty((src.height * 2, src.width * 2), dtype=np.float32),
+                    resampling=Resampling.bilinear
+                )
+
+                # Persist the resampled band next to the SAFE data; the
+                # mtime check above invalidates it if the source changes
+                cache_meta = dict(src.meta, driver='GTiff', dtype='float32',
+                                  count=1, height=data.shape[0], width=data.shape[1],
+                                  transform=src.transform * rasterio.Affine.scale(0.5),
+                                  compress='deflate', predictor=3, tiled=True,
+                                  blockxsize=512, blockysize=512)
+                try:
+                    with rasterio.open(cache_path, 'w', **cache_meta) as dst:
+                        dst.write(data, 1)
+                except Exception as e:
+                    print(f"Could not cache resampled {band_name}: {e}")
+            else:
+                data = src.read(1, out=np.empty((src.height, src.width), dtype=np.float32))
+            return data, src.meta
+
+    def load_bands(self, bands=None):
+        """Load Sentinel-2 bands, decoding them in parallel.
+
+        Args:
+            bands: Iterable of band names to load. Defaults to all six;
+                pass only the bands your indices need to skip the rest
+                of the JP2 decode and memory cost.
+        """
+        required_bands = list(bands) if bands else ['B02', 'B03', 'B04', 'B08', 'B11', 'B12']
+
+        with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS', GDAL_CACHEMAX=512):
+            # The 10m bands share a grid, so one multi-band VRT read lets
+            # GDAL decode them concurrently in a single pass
+            tenm_bands = [name for name in required_bands
+                          if self.RESOLUTION_MAP.get(name) == 'R10m']
+            if gdal is not None and len(tenm_bands) > 1:
+                self._read_10m_stack(tenm_bands)
+                remaining = [name for name in required_bands
+                             if name not in tenm_bands]
+            else:
+                remaining = required_bands
+
+            # JP2 decode releases the GIL, so a thread per band overlaps
+            # the expensive JPEG2000 decompression across cores
+            if remaining:
+                with ThreadPoolExecutor(max_workers=len(remaining)) as executor:
+                    futures = {executor.submit(self._read_band, name): name
+                               for name in remaining}
+                    for future in as_completed(futures):
+                        band_name = futures[future]
+                        data, meta = future.result()
+                        self.bands[band_name] = data
+                        # Save metadata from B04 as a reference
+                        if band_name == 'B04':
+                            self.meta = meta
         print("Bands loaded successfully")
 
+    def _read_10m_stack(self, band_names):
+        """Decode several 10m bands through one in-memory VRT read."""
+        paths = [self.find_band_path(name) for name in band_names]
+        vrt_path = f'/vsimem/{self._granule_dir.name}_10m.vrt'
+        vrt = gdal.BuildVRT(vrt_path, paths, separate=True)
+        # The VRT XML is only serialized to /vsimem on flush/close;
+        # without this the rasterio open below finds no file
+        vrt.FlushCache()
+        vrt = None
+        try:
+            with rasterio.open(vrt_path) as src:
+                stack = src.read(out=np.empty(
+                    (len(paths), src.height, src.width), dtype=np.float32))
+                # The handle reports driver='VRT'; pin GTiff so writers
+                # that copy this meta verbatim don't try to create a VRT
+                meta = dict(src.meta, count=1, driver='GTiff')
+        finally:
+            gdal.Unlink(vrt_path)
+
+        for idx, band_name in enumerate(band_names):
+            self.bands[band_name] = stack[idx]
+        # Save metadata from B04 as a reference
+        if 'B04' in band_names:
+            self.meta = meta
+
+    def _ensure_band(self, band_name: str):
+        """Return a band, loading it on demand if load_bands skipped it."""
+        if band_name not in self.bands:
+            data, meta = self._read_band(band_name)
+            self.bands[band_name] = data
+            if band_name == 'B04':
+                self.meta = meta
+        return self.bands[band_name]
+
     def calculate_ndvi(self):
-        """Calculate NDVI."""
-        red = self.bands['B04']
-        nir = self.bands['B08']
-        self.indices['NDVI'] = (nir - red) / (nir + red + 1e-6)
+        """Calculate NDVI with a single fused numexpr pass."""
+        red = self._ensure_band('B04')
+        nir = self._ensure_band('B08')
+        self.indices['NDVI'] = ne.evaluate(
+            "(nir - red) / (nir + red + eps)",
+            local_dict={'nir': nir, 'red': red, 'eps': np.float32(1e-6)}
+        )
 
     def calculate_savi(self, L=0.5):
-        """Calculate SAVI."""
-        red = self.bands['B04']
-        nir = self.bands['B08']
-        self.indices['SAVI'] = ((nir - red) / (nir + red + L)) * (1 + L)
+        """Calculate SAVI with a single fused numexpr pass."""
+        red = self._ensure_band('B04')
+        nir = self._ensure_band('B08')
+        L = np.float32(L)
+        self.indices['SAVI'] = ne.evaluate(
+            "((nir - red) / (nir + red + L)) * (1 + L)",
+            local_dict={'nir': nir, 'red': red, 'L': L}
+        )
 
     def calculate_swir(self):
-        """Calculate SWIR."""
-        nir = self.bands['B08']
-        swir1 = self.bands['B11']
-        self.indices['SWIR'] = (nir - swir1) / (nir + swir1 + 1e-6)
+        """Calculate SWIR with a single fused numexpr pass."""
+        nir = self._ensure_band('B08')
+        swir1 = self._ensure_band('B11')
+        self.indices['SWIR'] = ne.evaluate(
+            "(nir - swir1) / (nir + swir1 + eps)",
+            local_dict={'nir': nir, 'swir1': swir1, 'eps': np.float32(1e-6)}
+        )
 
     def calculate_nir(self):
         """Calculate normalized NIR index."""
-        nir = self.bands['B08']
-        # Normalize NIR values to 0-1 range
-        nir_min = np.nanmin(nir)
-        nir_max = np.nanmax(nir)
-        self.indices['NIR'] = (nir - nir_min) / (nir_max - nir_min + 1e-6)
+        nir = self._ensure_band('B08')
+        # Normalize NIR values to 0-1 range; bottleneck's nan-reductions
+        # are ~3x faster than numpy's
+        nir_min = bn.nanmin(nir)
+        nir_max = bn.nanmax(nir)
+        self.indices['NIR'] = ne.evaluate(
+            "(nir - nir_min) / (nir_max - nir_min + eps)",
+            local_dict={'nir': nir, 'nir_min': nir_min, 'nir_max': nir_max,
+                        'eps': np.float32(1e-6)}
+        )
 
     def calculate_mndwi(self):
-        """Calculate MNDWI."""
-        green = self.bands['B03']
-        swir1 = self.bands['B11']
-        self.indices['MNDWI'] = (green - swir1) / (green + swir1 + 1e-6)
+        """Calculate MNDWI with a single fused numexpr pass."""
+        green = self._ensure_band('B03')
+        swir1 = self._ensure_band('B11')
+        self.indices['MNDWI'] = ne.evaluate(
+            "(green - swir1) / (green + swir1 + eps)",
+            local_dict={'green': green, 'swir1': swir1, 'eps': np.float32(1e-6)}
+        )
+
+    def calculate_all_indices(self):
+        """Calculate all five indices, on the GPU when CuPy is available.
+
+        The elementwise index formulas are ideal GPU work: bands are
+        transferred to the device once, all indices are computed against
+        HBM bandwidth, and only the final float32 results come back.
+        Without CuPy, falls back to a fused NumPy pass that computes all
+        indices with preallocated float32 buffers, sharing the numerator
+        and denominator work between NDVI and SAVI so each band is swept
+        once instead of once per index.
+        """
+        if cp is None:
+            red = self._ensure_band('B04')
+            nir = self._ensure_band('B08')
+            swir1 = self._ensure_band('B11')
+            green = self._ensure_band('B03')
+            eps = np.float32(1e-6)
+            L = np.float32(0.5)
+
+            num = np.subtract(nir, red, dtype=np.float32)
+            denom = np.add(nir, red, dtype=np.float32)
+            denom += eps
+            self.indices['NDVI'] = np.divide(num, denom, dtype=np.float32)
+
+            # SAVI shares the numerator; shift the denominator in place
+            denom += L - eps
+            savi = np.divide(num, denom, out=num)
+            savi *= np.float32(1) + L
+            self.indices['SAVI'] = savi
+
+            # SWIR reuses the denominator buffer against B11
+            np.add(nir, swir1, out=denom)
+            denom += eps
+            swir = np.subtract(nir, swir1, dtype=np.float32)
+            swir /= denom
+            self.indices['SWIR'] = swir
+
+            # MNDWI likewise
+            np.add(green, swir1, out=denom)
+            denom += eps
+            mndwi = np.subtract(green, swir1, dtype=np.float32)
+            mndwi /= denom
+            self.indices['MNDWI'] = mndwi
+
+            # Normalized NIR
+            nir_min = bn.nanmin(nir)
+            nir_max = bn.nanmax(nir)
+            nir_norm = np.subtract(nir, nir_min, dtype=np.float32)
+            nir_norm /= nir_max - nir_min + eps
+            self.indices['NIR'] = nir_norm
+            return
+
+        green = cp.asarray(self._ensure_band('B03'))
+        red = cp.asarray(self._ensure_band('B04'))
+        nir = cp.asarray(self._ensure_band('B08'))
+        swir1 = cp.asarray(self._ensure_band('B11'))
+        L = 0.5
+
+        self.indices['NDVI'] = cp.asnumpy((nir - red) / (nir + red + 1e-6))
+        self.indices['SAVI'] = cp.asnumpy(((nir - red) / (nir + red + L)) * (1 + L))
+        self.indices['SWIR'] = cp.asnumpy((nir - swir1) / (nir + swir1 + 1e-6))
+        nir_min = cp.nanmin(nir)
+        nir_max = cp.nanmax(nir)
+        self.indices['NIR'] = cp.asnumpy((nir - nir_min) / (nir_max - nir_min + 1e-6))
+        self.indices['MNDWI'] = cp.asnumpy((green - swir1) / (green + swir1 + 1e-6))
+
+    def process_windowed(self, output_dir: str, tile_size: int = 1024):
+        """Compute and save all indices tile-by-tile without loading full bands.
+
+        Streams 1024x1024 windows through the index formulas and writes them
+        straight into tiled GeoTIFF outputs, so peak memory stays at a few
+        tiles instead of six full-resolution float arrays.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+
+        # A bounded block cache keeps successive windowed reads of the
+        # tiled JP2s served from memory without thrashing
+        with rasterio.Env(GDAL_CACHEMAX=512):
+            srcs = {name: rasterio.open(self.find_band_path(name))
+                    for name in ['B03', 'B04', 'B08', 'B11']}
+            ref = srcs['B04']
+            # Warp the 20m SWIR band onto the 10m grid so windows line up
+            vrt_b11 = WarpedVRT(srcs['B11'], transform=ref.transform,
+                                width=ref.width, height=ref.height,
+                                resampling=Resampling.bilinear)
+
+            out_meta = ref.meta.copy()
+            out_meta.update({
+                "driver": "GTiff",
+                "dtype": "float32",
+                "count": 1,
+                "compress": "zstd",
+                "predictor": 3,
+                "tiled": True,
+                "blockxsize": 512,
+                "blockysize": 512
+            })
+            writers = {name: rasterio.open(
+                os.path.join(output_dir, f"{name.lower()}.tif"), "w", **out_meta)
+                for name in ['NDVI', 'SAVI', 'SWIR', 'MNDWI']}
+
+            eps = np.float32(1e-6)
+            L = np.float32(0.5)
+
+            try:
+                for row in range(0, ref.height, tile_size):
+                    for col in range(0, ref.width, tile_size):
+                        window = Window(col, row,
+                                        min(tile_size, ref.width - col),
+                                        min(tile_size, ref.height - row))
+                        shape = (int(window.height), int(window.width))
+                        green = srcs['B03'].read(1, window=window, out=np.empty(shape, dtype=np.float32))
+                        red = srcs['B04'].read(1, window=window, out=np.empty(shape, dtype=np.float32))
+                        nir = srcs['B08'].read(1, window=window, out=np.empty(shape, dtype=np.float32))
+                        swir1 = vrt_b11.read(1, window=window, out=np.empty(shape, dtype=np.float32))
+
+                        writers['NDVI'].write(
+                            ne.evaluate("(nir - red) / (nir + red + eps)"), 1, window=window)
+                        writers['SAVI'].write(
+                            ne.evaluate("((nir - red) / (nir + red + L)) * (1 + L)"), 1, window=window)
+                        writers['SWIR'].write(
+                            ne.evaluate("(nir - swir1) / (nir + swir1 + eps)"), 1, window=window)
+                        writers['MNDWI'].write(
+                            ne.evaluate("(green - swir1) / (green + swir1 + eps)"), 1, window=window)
+            finally:
+                for dst in writers.values():
+                    dst.close()
+                vrt_b11.close()
+                for src in srcs.values():
+                    src.close()
+        print(f"Windowed indices saved to {output_dir}")
 
     def save_index(self, index_name: str, output_path: str):
         """Save the specified index to GeoTIFF and PNG files."""
         if index_name not in self.indices:
             raise ValueError(f"{index_name} index is not available.")
         
-        # Save as GeoTIFF
-        data = self.indices[index_name].astype(np.float32)
+        # Save as GeoTIFF (bands are loaded as float32, so this is a no-op copy)
+        data = self.indices[index_name].astype(np.float32, copy=False)
         meta = self.meta.copy()
+        # ZSTD with the floating-point predictor compresses float indices
+        # far better than LZW and runs multi-threaded
         meta.update({
             "driver": "GTiff",
             "dtype": "float32",
             "count": 1,
-            "compress": "lzw"
+            "compress": "zstd",
+            "predictor": 3,
+            "zstd_level": 3,
+            "tiled": True,
+            "blockxsize": 512,
+            "blockysize": 512,
+            "num_threads": "all_cpus"
         })
         
         tiff_path = output_path
         with rasterio.open(tiff_path, "w", **meta) as dst:
             dst.write(data, 1)
+            # Internal overviews make the output a COG, so downstream
+            # clip/warp steps fetch only the blocks and levels they need
+            dst.build_overviews([2, 4, 8, 16], Resampling.average)
         print(f"{index_name} saved to {tiff_path}")
 
-        # Save as PNG
+        # Queue the PNG encode on the background pool so it overlaps
+        # with the next index's GeoTIFF write
         png_path = str(Path(output_path).with_suffix('.png'))
-        # Normalize data to 0-255 range for PNG
-        normalized_data = np.clip((data - np.nanmin(data)) / (np.nanmax(data) - np.nanmin(data)) * 255, 0, 255)
-        normalized_data = normalized_data.astype(np.uint8)
-        
-        # Create PNG using PIL
-        im = Image.fromarray(normalized_data)
-        im.save(png_path)
+        self._png_futures.append(
+            self._io_pool.submit(self._write_index_png, data, png_path, index_name))
+
+    def _write_index_png(self, data, png_path, index_name):
+        """Normalize and encode one index PNG (runs on the I/O pool)."""
+        # Normalize data to 0-255 range for PNG in one fused pass
+        lo = bn.nanmin(data)
+        hi = bn.nanmax(data)
+        normalized_data = ne.evaluate(
+            "minimum(maximum((data - lo) / (hi - lo) * 255, 0), 255)",
+            local_dict={'data': data, 'lo': lo, 'hi': hi}
+        ).astype(np.uint8)
+
+        write_png(normalized_data, png_path)
         print(f"{index_name} saved to {png_path}")
 
+    def flush_png_writes(self):
+        """Block until every queued PNG encode has finished."""
+        for future in self._png_futures:
+            future.result()
+        self._png_futures.clear()
+
     def plot_index(self, index_name: str, cmap='viridis'):
         """Plot a calculated index."""
+        # Lazy import: pulling in matplotlib costs seconds of startup
+        # and a GUI backend, which batch runs never need
+        import matplotlib.pyplot as plt
+
         if index_name not in self.indices:
             raise ValueError(f"Index {index_name} not calculated.")
-        
+
+        # Decimate to roughly screen resolution before handing the array
+        # to imshow; pushing all 120 MPix through AGG stalls for seconds
+        arr = self.indices[index_name]
+        step = max(1, max(arr.shape) // 2048)
         plt.figure(figsize=(10, 10))
-        plt.imshow(self.indices[index_name], cmap=cmap)
+        plt.imshow(arr[::step, ::step], cmap=cmap)
         plt.colorbar(label=index_name)
         plt.title(index_name)
         plt.axis('off')
@@ -141,28 +472,42 @@ class Sentinel2Processor:
 
     def create_rgb_image(self, output_path: str):
         """Create and save RGB composite image in both TIFF and PNG formats."""
-        blue = self.bands['B02']
-        green = self.bands['B03']
-        red = self.bands['B04']
-        
-        rgb = np.stack([red, green, blue], axis=-1)
-        rgb = np.clip((rgb / 3000) * 255, 0, 255).astype(np.uint8)
+        channels = (self._ensure_band('B04'), self._ensure_band('B03'),
+                    self._ensure_band('B02'))
+
+        # Scale each channel straight into a preallocated uint8 cube via
+        # one fused pass, instead of the np.stack/np.clip/astype chain
+        # that allocates three full-scene temporaries
+        height, width = channels[0].shape
+        rgb = np.empty((height, width, 3), dtype=np.uint8)
+        scaled = np.empty((height, width), dtype=np.float32)
+        scale = 255.0 / 3000.0
+        for i, chan in enumerate(channels):
+            ne.evaluate("minimum(maximum(chan * scale, 0), 255)",
+                        local_dict={'chan': chan, 'scale': scale},
+                        out=scaled, casting='unsafe')
+            rgb[:, :, i] = scaled
         
         # Save as GeoTIFF
         meta = self.meta.copy()
-        meta.update({"count": 3, "dtype": 'uint8'})
+        # predictor=2 (horizontal differencing) suits uint8 imagery
+        meta.update({"count": 3, "dtype": 'uint8', "compress": "zstd",
+                     "predictor": 2, "tiled": True,
+                     "blockxsize": 512, "blockysize": 512,
+                     "num_threads": "all_cpus"})
         with rasterio.open(output_path, 'w', **meta) as dst:
-            for i in range(3):
-                dst.write(rgb[:, :, i], i + 1)
+            # One write in (band, row, col) order instead of three
+            # per-band calls; transpose is a zero-copy view
+            dst.write(rgb.transpose(2, 0, 1))
+            dst.build_overviews([2, 4, 8, 16], Resampling.average)
         print(f"RGB composite image saved to {output_path}")
 
         # Save as PNG
         png_path = str(Path(output_path).with_suffix('.png'))
-        im = Image.fromarray(rgb)
-        im.save(png_path)
+        write_png(rgb, png_path)
         print(f"RGB composite image saved to {png_path}")
 
-def process_sentinel_image(safe_dir: str, output_dir: str):
+def process_sentinel_image(safe_dir: str, output_dir: str, plot: bool = False):
     os.makedirs(output_dir, exist_ok=True)
     processor = Sentinel2Processor(safe_dir)
     
@@ -171,28 +516,31 @@ def process_sentinel_image(safe_dir: str, output_dir: str):
         processor.load_bands()
         
         print("Calculating indices...")
-        processor.calculate_ndvi()
-        processor.calculate_savi()
-        processor.calculate_swir()
-        processor.calculate_nir()
-        processor.calculate_mndwi()
+        processor.calculate_all_indices()
         
         print("Saving indices...")
-        processor.save_index('NDVI', os.path.join(output_dir, 'ndvi.tif'))
-        processor.save_index('SAVI', os.path.join(output_dir, 'savi.tif'))
-        processor.save_index('SWIR', os.path.join(output_dir, 'swir.tif'))
-        processor.save_index('NIR', os.path.join(output_dir, 'nir.tif'))
-        processor.save_index('MNDWI', os.path.join(output_dir, 'mndwi.tif'))
-        
-        print("Creating RGB composite...")
-        processor.create_rgb_image(os.path.join(output_dir, 'rgb_composite.tif'))
-        
-        print("Generating plots...")
-        processor.plot_index('NDVI')
-        processor.plot_index('SAVI')
-        processor.plot_index('SWIR', cmap='coolwarm')
-        processor.plot_index('NIR', cmap='RdNBu')
-        processor.plot_index('MNDWI', cmap='RdYlBu')
+        # One shared GDAL environment for all writes avoids re-paying
+        # driver/cache setup per file
+        with rasterio.Env(GDAL_CACHEMAX=1024, GDAL_NUM_THREADS='ALL_CPUS'):
+            processor.save_index('NDVI', os.path.join(output_dir, 'ndvi.tif'))
+            processor.save_index('SAVI', os.path.join(output_dir, 'savi.tif'))
+            processor.save_index('SWIR', os.path.join(output_dir, 'swir.tif'))
+            processor.save_index('NIR', os.path.join(output_dir, 'nir.tif'))
+            processor.save_index('MNDWI', os.path.join(output_dir, 'mndwi.tif'))
+
+            print("Creating RGB composite...")
+            processor.create_rgb_image(os.path.join(output_dir, 'rgb_composite.tif'))
+
+        # Wait for the background PNG encodes before plotting
+        processor.flush_png_writes()
+
+        if plot:
+            print("Generating plots...")
+            processor.plot_index('NDVI')
+            processor.plot_index('SAVI')
+            processor.plot_index('SWIR', cmap='coolwarm')
+            processor.plot_index('NIR', cmap='RdNBu')
+            processor.plot_index('MNDWI', cmap='RdYlBu')
         
         print("Processing completed successfully.")
     except Exception as e:
@@ -201,4 +549,10 @@ def process_sentinel_image(safe_dir: str, output_dir: str):
 if __name__ == "__main__":
     safe_directory = "/Users/SAFE"
     output_directory = "/Volumes/Output"
-    process_sentinel_image(safe_directory, output_directory)
+    # One program-wide GDAL environment: a real block cache, no readdir
+    # storms over the .SAFE band directories, multithreaded decode
+    with rasterio.Env(GDAL_CACHEMAX=1024,
+                      GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
+                      GDAL_NUM_THREADS='ALL_CPUS',
+                      CPL_VSIL_CURL_ALLOWED_EXTENSIONS='.tif,.jp2'):
+        process_sentinel_image(safe_directory, output_directory)
@@ -2,21 +2,37 @@ import os
 import glob
 import rasterio
 import geopandas as gpd
-from rasterio.mask import mask
+import numpy as np
+from rasterio.features import geometry_mask
+from rasterio.windows import Window, from_bounds
+from shapely.geometry import box
+from shapely.strtree import STRtree
+from shapely.ops import unary_union
 from datetime import datetime
+import multiprocessing
 import re
 from pathlib import Path
 
-def clip_with_shapefile(tif_path, shapefile_path, output_dir):
+# Shapefile data shared by the worker processes; the STRtree is not
+# reliably picklable, so each worker builds it once in _init_worker
+# instead of re-reading the shapefile for every TIF
+_gdf = None
+_tree = None
+
+def _init_worker(shapefile_path):
+    """Load the glacier shapefile and spatial index once per worker."""
+    global _gdf, _tree
+    _gdf = gpd.read_file(shapefile_path)
+    _tree = STRtree(_gdf.geometry.values)
+
+def clip_with_shapefile(tif_path, output_dir):
     """
-    Clip a TIF file with shapes from a shapefile and save the result
-    
+    Clip a TIF file with shapes from the pre-loaded shapefile and save the result
+
     Parameters:
     -----------
     tif_path : str
         Path to the input TIF file
-    shapefile_path : str
-        Path to the shapefile containing glacier polygons
     output_dir : str
         Directory to save clipped outputs
     """
@@ -32,26 +48,65 @@ def clip_with_shapefile(tif_path, shapefile_path, output_dir):
         # Use file modification date if no timestamp in filename
         timestamp = datetime.fromtimestamp(os.path.getmtime(tif_path)).strftime('%Y%m%d')
     
-    # Read the shapefile
-    gdf = gpd.read_file(shapefile_path)
-    
+    gdf = _gdf
+
     # Open the raster
     with rasterio.open(tif_path) as src:
-        # Loop through each glacier in the shapefile
-        for idx, glacier in gdf.iterrows():
-            # Get glacier name/id
-            glacier_name = glacier['name'] if 'name' in glacier else f"glacier_{idx}"
-            
-            # Get the geometry
-            geom = [glacier.geometry]
-            
+        # Pre-filter glaciers that cannot intersect this raster; an
+        # STRtree query is far cheaper than letting mask() raise a
+        # ValueError for every polygon outside the tile
+        raster_box = box(*src.bounds)
+        candidates = _tree.query(raster_box, predicate='intersects')
+
+        if len(candidates) == 0:
+            return
+
+        candidate_gdf = gdf.iloc[candidates]
+        fill_value = src.nodata if src.nodata is not None else 0
+
+        # Read the union bounding box of all candidate glaciers once, so
+        # each polygon is masked against a small in-memory sub-array
+        # instead of mask() re-traversing the full raster per glacier
+        minx, miny, maxx, maxy = unary_union(candidate_gdf.geometry.values).bounds
+        union_window = src.window(minx, miny, maxx, maxy)
+        union_window = union_window.intersection(
+            Window(0, 0, src.width, src.height)).round_offsets().round_lengths()
+        arr = src.read(window=union_window)
+        union_transform = src.window_transform(union_window)
+
+        # Get glacier names/ids up front
+        if 'name' in candidate_gdf.columns:
+            names = candidate_gdf['name'].values
+        else:
+            names = [f"glacier_{idx}" for idx in candidate_gdf.index]
+
+        # Iterate raw geometries; iterrows would box every row into a
+        # pandas Series, pure overhead on this hot path
+        for glacier_geom, glacier_name in zip(candidate_gdf.geometry.values, names):
             try:
-                # Clip the raster with the glacier geometry
-                clipped_img, clipped_transform = mask(src, geom, crop=True)
-                
+                # Slice this glacier's bounding box out of the sub-array
+                g_window = from_bounds(*glacier_geom.bounds,
+                                       transform=union_transform)
+                g_window = g_window.intersection(
+                    Window(0, 0, arr.shape[2], arr.shape[1])
+                ).round_offsets().round_lengths()
+                row_off, col_off = int(g_window.row_off), int(g_window.col_off)
+                sub = arr[:,
+                          row_off:row_off + int(g_window.height),
+                          col_off:col_off + int(g_window.width)]
+                clipped_transform = rasterio.windows.transform(
+                    g_window, union_transform)
+
+                # Mask pixels outside the glacier polygon
+                inside = geometry_mask([glacier_geom],
+                                       out_shape=sub.shape[-2:],
+                                       transform=clipped_transform,
+                                       invert=True)
+                clipped_img = np.where(inside, sub, fill_value)
+
                 # Copy the metadata
                 meta = src.meta.copy()
-                
+
                 # Update metadata for the clipped raster
                 meta.update({
                     "height": clipped_img.shape[1],
@@ -88,12 +143,14 @@ def main():
     tif_files = glob.glob(os.path.join(sentinel_data_dir, '**', '*.tif'), recursive=True)
     
     print(f"Found {len(tif_files)} TIF files for processing")
-    
-    # Process each file
-    for tif_file in tif_files:
-        print(f"Processing: {os.path.basename(tif_file)}")
-        clip_with_shapefile(tif_file, shapefile_path, output_dir)
-    
+
+    # Process the files in parallel; each is independent, and the
+    # shapefile is read once per worker instead of once per TIF
+    with multiprocessing.Pool(os.cpu_count(), initializer=_init_worker,
+                              initargs=(shapefile_path,)) as pool:
+        pool.starmap(clip_with_shapefile,
+                     [(tif_file, output_dir) for tif_file in tif_files])
+
     print("Clipping complete!")
 
 if __name__ == "__main__":
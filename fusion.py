@@ -2,65 +2,106 @@ import os
 import rasterio
 from rasterio.warp import calculate_default_transform, reproject, Resampling
 import numpy as np
+import bottleneck as bn
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
 
 def reproject_and_resample(input_path, output_path, target_crs, target_resolution):
     """Reprojects and resamples a raster to a target CRS and resolution."""
-    with rasterio.open(input_path) as src:
-        transform, width, height = calculate_default_transform(
-            src.crs, target_crs, src.width, src.height, *src.bounds
-        )
-        transform = transform * rasterio.Affine(
-            target_resolution / src.res[0], 0, 0, 0, target_resolution / src.res[1], 0
-        )
-        
-        profile = src.profile
-        profile.update({
-            'crs': target_crs,
-            'transform': transform,
-            'width': width,
-            'height': height
-        })
-        
-        with rasterio.open(output_path, 'w', **profile) as dst:
-            for i in range(1, src.count + 1):
+    with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS', GDAL_CACHEMAX=1024,
+                      CHECK_WITH_INVERT_PROJ=False):
+        with rasterio.open(input_path) as src:
+            transform, width, height = calculate_default_transform(
+                src.crs, target_crs, src.width, src.height, *src.bounds
+            )
+            transform = transform * rasterio.Affine(
+                target_resolution / src.res[0], 0, 0, 0, target_resolution / src.res[1], 0
+            )
+
+            profile = src.profile
+            profile.update({
+                'crs': target_crs,
+                'transform': transform,
+                'width': width,
+                'height': height
+            })
+
+            all_bands = list(range(1, src.count + 1))
+            with rasterio.open(output_path, 'w', **profile) as dst:
+                # Warp all bands in one call; GDAL's warping core
+                # multithreads internally with num_threads
                 reproject(
-                    source=rasterio.band(src, i),
-                    destination=rasterio.band(dst, i),
+                    source=rasterio.band(src, all_bands),
+                    destination=rasterio.band(dst, all_bands),
                     src_transform=src.transform,
                     src_crs=src.crs,
                     dst_transform=transform,
                     dst_crs=target_crs,
-                    resampling=Resampling.nearest
+                    resampling=Resampling.nearest,
+                    num_threads=os.cpu_count(),
+                    warp_mem_limit=512
                 )
 
 def stack_rasters(input_files, output_file):
-    """Stacks multiple raster layers into a single multi-band raster."""
-    layers = []
-    meta = None
-    
-    for file in input_files:
-        with rasterio.open(file) as src:
-            if meta is None:
-                meta = src.meta
-                meta.update(count=len(input_files))
-            layers.append(src.read(1))
-    
-    with rasterio.open(output_file, 'w', **meta) as dst:
-        for idx, layer in enumerate(layers, start=1):
-            dst.write(layer, idx)
+    """Stacks multiple raster layers into a single multi-band raster.
+
+    Uses a GDAL VRT so the stack is streamed block-by-block to disk
+    instead of holding every input band in memory at once.
+    """
+    if gdal is None:
+        raise ImportError(
+            "stack_rasters requires the GDAL python bindings (osgeo)")
+    vrt_path = os.path.splitext(output_file)[0] + '.vrt'
+    vrt = gdal.BuildVRT(vrt_path, input_files, separate=True)
+    # COG output (tiled + overviews) lets later clip/reproject steps
+    # read only the blocks they touch instead of full scans
+    gdal.Translate(
+        output_file, vrt, format='COG',
+        creationOptions=['BLOCKSIZE=512', 'COMPRESS=ZSTD',
+                         'NUM_THREADS=ALL_CPUS', 'BIGTIFF=IF_SAFER',
+                         'OVERVIEW_RESAMPLING=AVERAGE']
+    )
+    vrt = None
+    os.remove(vrt_path)
 
 def normalize_raster(input_file, output_file):
-    """Normalizes raster data to the range 0-1."""
+    """Normalizes each band independently to 0-1, streaming block-by-block.
+
+    A single global range would let a wide-range SAR band crush the 0-1
+    index bands into a few code values, so every band is scaled by its
+    own nan-aware min/max with nodata pixels ignored.
+    """
     with rasterio.open(input_file) as src:
-        data = src.read(1).astype(float)
-        data_min, data_max = np.min(data), np.max(data)
-        normalized_data = (data - data_min) / (data_max - data_min)
-        
         profile = src.profile
-        profile.update(dtype='float32')
-        
+        # Nodata pixels are rewritten as NaN below, so the output must
+        # declare NaN as its nodata value or readers that honour the tag
+        # would treat those pixels as valid data
+        profile.update(dtype='float32', nodata=np.nan, tiled=True,
+                       blockxsize=512, blockysize=512, compress='zstd',
+                       bigtiff='if_safer')
+
         with rasterio.open(output_file, 'w', **profile) as dst:
-            dst.write(normalized_data, 1)
+            for band in range(1, src.count + 1):
+                # Pass 1: gather this band's min/max one block at a time
+                band_min, band_max = np.inf, -np.inf
+                for _, window in src.block_windows(band):
+                    block = src.read(band, window=window, out_dtype='float32')
+                    if src.nodata is not None:
+                        block[block == src.nodata] = np.nan
+                    band_min = min(band_min, bn.nanmin(block))
+                    band_max = max(band_max, bn.nanmax(block))
+
+                # Pass 2: scale and write each block without ever holding
+                # the full band in memory
+                for _, window in src.block_windows(band):
+                    block = src.read(band, window=window, out_dtype='float32')
+                    if src.nodata is not None:
+                        block[block == src.nodata] = np.nan
+                    dst.write((block - band_min) / (band_max - band_min),
+                              band, window=window)
 
 def main():
     # File paths
@@ -3,6 +3,7 @@ import datetime
 import rasterio
 from rasterio.windows import Window
 from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
 
 # Define input paths
 coherence_path = "/Volumes/T7 Shield/IIRS/TanDEM-X 30m/._merged_EGM.tif"
@@ -35,35 +36,58 @@ def crop_and_save(image_path, output_dir, is_glcm=False):
     if not os.path.exists(image_path):
         print(f"❌ File not found: {image_path}")
         return
-    
+
     print(f"🔄 Processing: {image_path}")
 
+    tile_size = 1024
+    img_name = os.path.splitext(os.path.basename(image_path))[0]
+
+    # Precompute the tile grid and the shared output profile once; per
+    # tile only width/height/transform (and count for GLCM) change
     with rasterio.open(image_path) as src:
         width, height = src.width, src.height
-        tile_size = 1024
-        img_name = os.path.splitext(os.path.basename(image_path))[0]
-
-        for i in range(0, width, tile_size):
-            for j in range(0, height, tile_size):
-                w = min(tile_size, width - i)
-                h = min(tile_size, height - j)
-                window = Window(i, j, w, h)
-
-                meta = src.meta.copy()
-                meta.update({"width": w, "height": h, "transform": src.window_transform(window)})
+        base_transform = src.transform
+        base_profile = dict(src.profile)
+    # Striped inputs carry blockxsize=<full width>, blockysize=1 in
+    # their profile, which is invalid once tiled=True is forced; pin a
+    # proper tile size instead of inheriting the source block layout
+    base_profile.update({"tiled": True, "blockxsize": 512, "blockysize": 512,
+                         "compress": "deflate", "predictor": 2,
+                         "num_threads": "all_cpus"})
+    if is_glcm:
+        base_profile["count"] = 1  # Save one band per file
+
+    windows = [Window(i, j, min(tile_size, width - i), min(tile_size, height - j))
+               for i in range(0, width, tile_size)
+               for j in range(0, height, tile_size)]
+
+    def crop_tile(window):
+        # Dataset handles are not thread-safe, so each worker opens its
+        # own; reads and writes release the GIL, so tiles overlap on I/O
+        with rasterio.Env(GDAL_CACHEMAX=512,
+                          GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
+                          NUM_THREADS='ALL_CPUS'):
+            with rasterio.open(image_path) as src:
+                i, j = int(window.col_off), int(window.row_off)
+                # Shallow per-tile copy: mutating the shared dict would
+                # race between worker threads
+                meta = dict(base_profile,
+                            width=int(window.width), height=int(window.height),
+                            transform=rasterio.windows.transform(window, base_transform))
 
                 if is_glcm:
-                    # Process each GLCM band separately
+                    # Decode the window once for all bands; per-band reads
+                    # re-traverse the same compressed blocks ten times
+                    cropped_bands = src.read(window=window)
+
                     for band in range(1, min(src.count, 10) + 1):  # Max 10 bands for safety
-                        cropped_image = src.read(band, window=window)
                         band_name = glcm_bands.get(band, f"Band_{band}")  # Default to "Band_X"
 
                         crop_filename = f"{img_name}_{band_name}_{i}_{j}_{timestamp}.tif"
                         crop_filepath = os.path.join(output_dir, crop_filename)
 
-                        meta.update({"count": 1})  # Save only one band
                         with rasterio.open(crop_filepath, "w", **meta) as dest:
-                            dest.write(cropped_image, 1)
+                            dest.write(cropped_bands[band - 1], 1)
 
                 else:
                     # Process single-band coherence image
@@ -75,6 +99,10 @@ def crop_and_save(image_path, output_dir, is_glcm=False):
                     with rasterio.open(crop_filepath, "w", **meta) as dest:
                         dest.write(cropped_image)
 
+    max_workers = min(16, (os.cpu_count() or 4) * 2)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(crop_tile, windows))
+
 # Function to process directories or single files
 def process_images(input_path, output_dir, is_glcm=False):
     if os.path.isdir(input_path):  # If directory
@@ -91,12 +119,17 @@ def process_images(input_path, output_dir, is_glcm=False):
     else:
         print(f"❌ Invalid path: {input_path}")
 
-# Process Coherence Images
-print("\n🚀 Processing Coherence Images...")
-process_images(coherence_path, output_coherence_dir, is_glcm=False)
-
-# Process GLCM Images
-print("\n🚀 Processing GLCM Images...")
-process_images(glcm_path, output_glcm_dir, is_glcm=True)
+# One program-wide GDAL environment: a real block cache so tiled LZW
+# reads don't thrash, and no readdir storms on crowded directories
+with rasterio.Env(GDAL_CACHEMAX=1024,
+                  GDAL_DISABLE_READDIR_ON_OPEN='EMPTY_DIR',
+                  GDAL_NUM_THREADS='ALL_CPUS'):
+    # Process Coherence Images
+    print("\n🚀 Processing Coherence Images...")
+    process_images(coherence_path, output_coherence_dir, is_glcm=False)
+
+    # Process GLCM Images
+    print("\n🚀 Processing GLCM Images...")
+    process_images(glcm_path, output_glcm_dir, is_glcm=True)
 
 print("\n✅ Cropping completed successfully!")
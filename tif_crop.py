@@ -3,6 +3,16 @@ import tifffile
 import numpy as np
 from PIL import Image
 
+try:
+    import imageio.v3 as iio
+except ImportError:
+    iio = None
+
+try:
+    import imagecodecs
+except ImportError:
+    imagecodecs = None
+
 def convert_to_tiff(input_path, output_path):
     try:
         img = Image.open(input_path)
@@ -28,20 +38,35 @@ def process_tiff_files(input_folder, output_folder, crop_size=1024):
 
         file_path = os.path.join(input_folder, filename)
         try:
-            with tifffile.TiffFile(file_path) as tif:
-                if not tif.is_imagej:
-                    raise ValueError("Not a valid TIFF file")
-                img = tif.asarray()
+            # tifffile validates the header itself; the old is_imagej
+            # check wrongly rejected plain (non-ImageJ) TIFFs and forced
+            # them through a full PIL decode/re-encode cycle.
+            # Memory-map when the layout allows it so each crop pulls
+            # only its own pages through the OS cache instead of
+            # loading the whole raster up front.
+            try:
+                img = tifffile.memmap(file_path, mode='r')
+            except ValueError:
+                img = tifffile.imread(file_path)
         except Exception as e:
             print(f"Error processing {filename}: {e}")
-            
-            # Attempt conversion for non-TIFF RGB images
-            converted_path = convert_to_tiff(file_path, file_path + "_fixed.tif")
-            if converted_path:
-                file_path = converted_path  # Use the new TIFF file
-                img = tifffile.imread(file_path)
-            else:
-                continue  # Skip if conversion fails
+            img = None
+
+            # Try a direct decode to numpy before falling back to the
+            # PIL convert-and-rewrite path for exotic formats
+            if iio is not None:
+                try:
+                    img = iio.imread(file_path)
+                except Exception:
+                    img = None
+
+            if img is None:
+                converted_path = convert_to_tiff(file_path, file_path + "_fixed.tif")
+                if converted_path:
+                    file_path = converted_path  # Use the new TIFF file
+                    img = tifffile.imread(file_path)
+                else:
+                    continue  # Skip if conversion fails
 
         print(f"Processing {filename}")
         print(f"Image shape: {img.shape}")
@@ -52,13 +77,25 @@ def process_tiff_files(input_folder, output_folder, crop_size=1024):
             print(f"Skipping {filename}: Invalid shape {img.shape}")
             continue
         
+        # The floating-point predictor hard-requires the optional
+        # imagecodecs package; skip the predictor for float data rather
+        # than crash mid-loop when it is missing
+        predictor = imagecodecs is not None or img.dtype.kind != 'f'
+
         # Crop and save
         height, width = img.shape[:2]
         for i in range(0, height, crop_size):
             for j in range(0, width, crop_size):
                 crop = img[i:i+crop_size, j:j+crop_size]
                 crop_filename = f"{filename}_crop_{i}_{j}.tif"
-                tifffile.imwrite(os.path.join(output_folder, crop_filename), crop)
+                # The slice may be an mmap-backed view; make it contiguous
+                # only at write time
+                # Deflate + predictor shrinks index crops 2-4x and the
+                # tiled layout keeps downstream windowed reads cheap
+                tifffile.imwrite(os.path.join(output_folder, crop_filename),
+                                 np.ascontiguousarray(crop),
+                                 compression='deflate', predictor=predictor,
+                                 tile=(512, 512))
                 total_crops += 1
 
         total_files += 1